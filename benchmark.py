@@ -0,0 +1,308 @@
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+import mediapipe as mp
+
+from latencycontrol import percentile
+
+# Benchmark of face_landmarker.task over a recorded clip for a grid of model
+# settings. Every setting runs in its own process (with CPU affinity limiting
+# the cores the model may use) and is compared with the reference run at full
+# resolution. Frames are fed at the frame rate of the clip in both running modes
+# and latency is measured from the time each frame was due, like capture to
+# result in FacePipeline. The best setting for the latency budget is printed
+# as fragment of face_config.json:
+#
+#   python benchmark.py clip.mp4 --budget 40 --scales 1 0.75 0.5 --cores 0 1 2
+#
+# MediaPipe's Python API doesn't expose number of inference threads, so
+# the process is limited to the first N of its available cores instead (0 = all cores).
+
+BaseOptions = mp.tasks.BaseOptions
+FaceLandmarker = mp.tasks.vision.FaceLandmarker
+FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
+VisionRunningMode = mp.tasks.vision.RunningMode
+
+REFERENCE = {"scale": 1.0, "mode": "VIDEO", "cores": 0, "num_faces": 1, "delegate": "CPU"}
+MIN_COVERAGE = 0.9  # part of frames with result needed for the best setting
+
+
+def load_frames(path: str, max_frames: int):
+    """
+    Decodes at most max_frames frames of the clip.
+    Args:
+        path (str): Path of the recorded clip.
+        max_frames (int): Maximal number of frames.
+    Returns:
+        Tuple[List[numpy.ndarray], float]: BGR frames and frame rate of the clip.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Couldn't open clip {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames, fps
+
+
+def to_image(frame, scale: float) -> mp.Image:
+    """
+    Scales and converts BGR frame like FacePipeline does.
+    """
+    if scale < 1.0:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    return mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb)
+
+
+def first_face(result) -> Optional[List[tuple]]:
+    """
+    Returns (x, y) of landmarks of the first face or None without face.
+    """
+    if result is None or not result.face_landmarks:
+        return None
+    return [(landmark.x, landmark.y) for landmark in result.face_landmarks[0]]
+
+
+def run_setting(
+    path: str, max_frames: int, model_path: str, setting: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Runs the model over the clip with one setting. Meant to run in its own process.
+
+    Args:
+        path (str): Path of the recorded clip.
+        max_frames (int): Maximal number of frames.
+        model_path (str): Path of face_landmarker.task.
+        setting (Dict[str, Any]): scale, mode, cores, num_faces and delegate.
+
+    Returns:
+        Dict[str, Any]: Setting with measured throughput, latencies, CPU usage
+            and landmarks of every frame.
+    """
+    if setting["cores"]:
+        # the first of the cores available to the process, e.g. in a container
+        os.sched_setaffinity(0, sorted(os.sched_getaffinity(0))[: setting["cores"]])
+
+    frames, fps = load_frames(path, max_frames)
+    period = 1 / fps
+    live_stream = setting["mode"] == "LIVE_STREAM"
+
+    landmarks = [None] * len(frames)
+    latencies = []
+    submit_times = dict()
+    lock = threading.Lock()
+
+    def on_result(result, output_image, timestamp_ms):
+        done = time.monotonic()
+        with lock:
+            index, frame_time = submit_times.pop(timestamp_ms)
+            landmarks[index] = first_face(result)
+            latencies.append((done - frame_time) * 1000)
+
+    options = FaceLandmarkerOptions(
+        base_options=BaseOptions(
+            model_asset_path=model_path, delegate=BaseOptions.Delegate[setting["delegate"]]
+        ),
+        running_mode=VisionRunningMode[setting["mode"]],
+        num_faces=setting["num_faces"],
+        result_callback=on_result if live_stream else None,
+    )
+
+    with FaceLandmarker.create_from_options(options) as landmarker:
+        start = time.monotonic()
+        cpu_start = time.process_time()
+        last_timestamp_ms = -1
+
+        for index, frame in enumerate(frames):
+            # frames come at the clip frame rate like from camera in both modes and
+            # latency counts from the time the frame was captured, so frames waiting
+            # behind slow inference in VIDEO mode are included
+            frame_time = start + index * period
+            now = time.monotonic()
+            if frame_time > now:
+                time.sleep(frame_time - now)
+
+            if live_stream:
+                timestamp_ms = max(int(time.monotonic() * 1000), last_timestamp_ms + 1)
+                last_timestamp_ms = timestamp_ms
+                with lock:
+                    submit_times[timestamp_ms] = (index, frame_time)
+                landmarker.detect_async(to_image(frame, setting["scale"]), timestamp_ms)
+            else:
+                result = landmarker.detect_for_video(
+                    to_image(frame, setting["scale"]), int(index * period * 1000)
+                )
+                latencies.append((time.monotonic() - frame_time) * 1000)
+                landmarks[index] = first_face(result)
+
+        # waiting for the result of the last frame, frames dropped by the model never get one
+        if live_stream:
+            deadline = time.monotonic() + 1
+            while time.monotonic() < deadline:
+                with lock:
+                    if last_timestamp_ms not in submit_times:
+                        break
+                time.sleep(0.01)
+
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+
+    return {
+        **setting,
+        "frames": len(frames),
+        "results": len(latencies),
+        "fps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "cpu": cpu / elapsed,
+        "landmarks": landmarks,
+    }
+
+
+def agreement(measured: List, reference: List) -> Dict[str, float]:
+    """
+    Compares landmarks of the setting with landmarks of the reference run.
+    Returns:
+        Dict[str, float]: Mean landmark distance in normalized units and part of
+            reference faces which were found (frames dropped by the model count as missed).
+    """
+    errors = []
+    found = 0
+    faces = 0
+    for landmarks, reference_landmarks in zip(measured, reference):
+        if reference_landmarks is None:
+            continue
+        faces += 1
+        if landmarks is None:
+            continue
+        found += 1
+        errors.append(
+            sum(math.dist(p, q) for p, q in zip(landmarks, reference_landmarks))
+            / len(reference_landmarks)
+        )
+    return {
+        "error": sum(errors) / len(errors) if errors else math.nan,
+        "found": found / faces if faces else math.nan,
+    }
+
+
+def best_setting(results: List[Dict[str, Any]], budget_ms: float) -> Optional[Dict[str, Any]]:
+    """
+    Returns the most accurate setting whose p95 latency fits the budget,
+    less CPU usage decides between equally accurate ones.
+    """
+    candidates = [
+        result
+        for result in results
+        if result["p95_ms"] <= budget_ms
+        and result["results"] >= MIN_COVERAGE * result["frames"]
+        and not math.isnan(result["error"])
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda result: (round(result["error"], 4), result["cpu"]))
+
+
+def config_fragment(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns face_config.json keys for the setting.
+    """
+    return {
+        "INPUT_SCALE": result["scale"],
+        "RUNNING_MODE": result["mode"],
+        "NUM_FACES": result["num_faces"],
+        "DELEGATE": result["delegate"],
+        "CPU_CORES": result["cores"],
+    }
+
+
+def benchmark_proc(args) -> None:
+    """
+    Runs reference and all settings of the grid and prints results.
+    """
+    settings = [
+        {"scale": scale, "mode": mode, "cores": cores, "num_faces": num_faces, "delegate": delegate}
+        for scale, mode, cores, num_faces, delegate in itertools.product(
+            args.scales, args.modes, args.cores, args.num_faces, args.delegates
+        )
+    ]
+    if any(setting["cores"] for setting in settings) and not hasattr(os, "sched_setaffinity"):
+        print("Limiting cores is not supported on this system, using all cores")
+        for setting in settings:
+            setting["cores"] = 0
+
+    # every setting in fresh process, so the settings don't affect each other
+    context = multiprocessing.get_context("spawn")
+
+    def run(setting):
+        with context.Pool(1) as pool:
+            return pool.apply(run_setting, (args.clip, args.frames, args.model, setting))
+
+    print(f"Reference: {REFERENCE}")
+    reference_result = run(REFERENCE)
+    if not reference_result["frames"]:
+        print(f"No frames read from clip {args.clip}")
+        return
+    reference = reference_result["landmarks"]
+
+    results = []
+    print(
+        f"{'scale':>5} {'mode':>11} {'cores':>5} {'faces':>5} {'deleg':>5} "
+        f"{'fps':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'cpu':>5} {'error':>7} {'found':>6}"
+    )
+    for setting in settings:
+        try:
+            result = run(setting)
+        except Exception as e:
+            print(f"Setting {setting} failed: {e}")
+            continue
+        result.update(agreement(result.pop("landmarks"), reference))
+        results.append(result)
+        print(
+            f"{result['scale']:>5} {result['mode']:>11} {result['cores'] or 'all':>5} "
+            f"{result['num_faces']:>5} {result['delegate']:>5} {result['fps']:>6.1f} "
+            f"{result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} {result['p99_ms']:>7.1f} "
+            f"{result['cpu']:>5.0%} {result['error']:>7.4f} {result['found']:>6.1%}"
+        )
+
+    best = best_setting(results, args.budget)
+    if best is None:
+        print(f"No setting fits p95 latency budget of {args.budget} ms")
+        return
+
+    print(f"Best setting for p95 latency budget of {args.budget} ms, face_config.json:")
+    print(json.dumps(config_fragment(best), indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark face_landmarker.task settings over a recorded clip"
+    )
+    parser.add_argument("clip", help="path of the recorded clip")
+    parser.add_argument("--budget", type=float, default=60, help="p95 latency budget [ms]")
+    parser.add_argument("--frames", type=int, default=300, help="frames of the clip used")
+    parser.add_argument("--model", default="face_landmarker.task", help="path of the model")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5])
+    parser.add_argument(
+        "--modes", nargs="+", default=["VIDEO", "LIVE_STREAM"], choices=["VIDEO", "LIVE_STREAM"]
+    )
+    parser.add_argument("--cores", type=int, nargs="+", default=[0], help="0 = all cores")
+    parser.add_argument("--num-faces", type=int, nargs="+", default=[1])
+    parser.add_argument("--delegates", nargs="+", default=["CPU"], choices=["CPU", "GPU"])
+    benchmark_proc(parser.parse_args())
@@ -5,10 +5,10 @@ import time
 import os
 import json
 
-if not os.path.isfile("face_config.json"):
-    print("Missing config file, download face_config.json before running")
-    quit()
-else:
+# Default closing time is taken from config file when it is available,
+# library users may pass their own value to check_eyes_closed
+CLOSED_TIME = 1  # [s]
+if os.path.isfile("face_config.json"):
     with open("face_config.json", "r") as file:
         face_config = json.load(file)
         CLOSED_TIME = face_config["CLOSED_EYES_TIME"]
@@ -64,12 +64,17 @@ def is_eye_closed(
     return ratio
 
 
-def check_eyes_closed(landmarks: List[NormalizedLandmark]) -> Tuple[bool, bool, bool]:
+def check_eyes_closed(
+    landmarks: List[NormalizedLandmark], state=None, closed_time: float = None
+) -> Tuple[bool, bool, bool]:
     """
     Determines if the left and right eyes are closed based on facial landmarks.
 
     Args:
         landmarks (List[NormalizedLandmark]): A list of normalized facial landmarks.
+        state (object): Object keeping memory between calls (e.g. types.SimpleNamespace),
+            separate one is needed for every tracked face. Function itself is used if None.
+        closed_time (float): Time of closed eyes needed for activation, CLOSED_TIME if None.
 
     Returns:
         bool: Pulse when eyes have been closed.
@@ -81,14 +86,19 @@ def check_eyes_closed(landmarks: List[NormalizedLandmark]) -> Tuple[bool, bool,
         - The `is_eye_closed` function is called for each eye.
     """
 
+    if state is None:
+        state = check_eyes_closed
+    if closed_time is None:
+        closed_time = CLOSED_TIME
+
     # Initialize memory attributes once
-    if not hasattr(check_eyes_closed, "in_closed"):
-        check_eyes_closed.in_closed = False
-        check_eyes_closed.last_trigger_t = 0
-        check_eyes_closed.output_triggered = False
-        check_eyes_closed.was_activated = False
-        check_eyes_closed.valid_closure = False
-        check_eyes_closed.states_buf = {"left": [], "right": []}
+    if not hasattr(state, "in_closed"):
+        state.in_closed = False
+        state.last_trigger_t = 0
+        state.output_triggered = False
+        state.was_activated = False
+        state.valid_closure = False
+        state.states_buf = {"left": [], "right": []}
 
     left_eye_indices = {"h1": 362, "h2": 263, "v1": 386, "v2": 374}
     right_eye_indices = {"h1": 33, "h2": 374, "v1": 159, "v2": 145}
@@ -97,19 +107,15 @@ def check_eyes_closed(landmarks: List[NormalizedLandmark]) -> Tuple[bool, bool,
     right_ratio = is_eye_closed(landmarks, right_eye_indices)
 
     # create moving buffer
-    check_eyes_closed.states_buf["left"].append(left_ratio)
-    check_eyes_closed.states_buf["right"].append(right_ratio)
-    if len(check_eyes_closed.states_buf["left"]) > BUF_SIZE:
-        check_eyes_closed.states_buf["left"].pop(0)
-        check_eyes_closed.states_buf["right"].pop(0)
+    state.states_buf["left"].append(left_ratio)
+    state.states_buf["right"].append(right_ratio)
+    if len(state.states_buf["left"]) > BUF_SIZE:
+        state.states_buf["left"].pop(0)
+        state.states_buf["right"].pop(0)
 
     # calculate averages
-    avg_left = sum(check_eyes_closed.states_buf["left"]) / len(
-        check_eyes_closed.states_buf["left"]
-    )
-    avg_right = sum(check_eyes_closed.states_buf["right"]) / len(
-        check_eyes_closed.states_buf["right"]
-    )
+    avg_left = sum(state.states_buf["left"]) / len(state.states_buf["left"])
+    avg_right = sum(state.states_buf["right"]) / len(state.states_buf["right"])
 
     # decide if eyes are closed and then save current time
     current_t = time.time()
@@ -120,43 +126,43 @@ def check_eyes_closed(landmarks: List[NormalizedLandmark]) -> Tuple[bool, bool,
 
     # Eyes currently closed
     if avg_left < CLOSED_THRESH and avg_right < CLOSED_THRESH:
-        if not check_eyes_closed.in_closed:
+        if not state.in_closed:
             # Eyes just closed — start timing
-            check_eyes_closed.in_closed = True
-            check_eyes_closed.last_trigger_t = current_t
-            check_eyes_closed.output_triggered = False
-            check_eyes_closed.was_activated = False
-            check_eyes_closed.valid_closure = False  # wait to see if it's not a blink
+            state.in_closed = True
+            state.last_trigger_t = current_t
+            state.output_triggered = False
+            state.was_activated = False
+            state.valid_closure = False  # wait to see if it's not a blink
 
         # Check if closure passed blink threshold
-        if not check_eyes_closed.valid_closure:
-            if current_t - check_eyes_closed.last_trigger_t >= MAX_BLINK_DURATION:
+        if not state.valid_closure:
+            if current_t - state.last_trigger_t >= MAX_BLINK_DURATION:
                 eyes_closed_output = (
                     True  # Only pulse once when valid closure confirmed
                 )
-                check_eyes_closed.valid_closure = True
+                state.valid_closure = True
 
         # Activate if eyes have stayed closed long enough
         if (
-            current_t - check_eyes_closed.last_trigger_t >= CLOSED_TIME
-            and not check_eyes_closed.output_triggered
+            current_t - state.last_trigger_t >= closed_time
+            and not state.output_triggered
         ):
             activate = True
-            check_eyes_closed.output_triggered = True
-            check_eyes_closed.was_activated = True
+            state.output_triggered = True
+            state.was_activated = True
 
     # Eyes currently open
     else:
-        if check_eyes_closed.in_closed:
+        if state.in_closed:
             # Only fail if it was a valid (non-blink) closure and no activation happened
-            if check_eyes_closed.valid_closure and not check_eyes_closed.was_activated:
+            if state.valid_closure and not state.was_activated:
                 eyes_failed = True
 
         # Reset state
-        check_eyes_closed.in_closed = False
-        check_eyes_closed.output_triggered = False
-        check_eyes_closed.was_activated = False
-        check_eyes_closed.valid_closure = False
+        state.in_closed = False
+        state.output_triggered = False
+        state.was_activated = False
+        state.valid_closure = False
 
     return eyes_closed_output, eyes_failed, activate
 
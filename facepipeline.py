@@ -0,0 +1,619 @@
+import contextlib
+import queue
+import threading
+import time
+import types
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import cv2
+import mediapipe as mp
+
+import faceexpressions as fe
+import supportfunctions as sf
+from headprediction import HeadMotionPredictor
+from latencycontrol import LatencyController
+from resultslot import FrameResult, ResultSlot
+from roitracker import RoiTracker
+from stationmsg import SIGNAL_NAMES
+
+# Loading the model from:
+# https://ai.google.dev/edge/mediapipe/solutions/vision/face_landmarker/index#models
+# and configure parameters as written in google docs api
+BaseOptions = mp.tasks.BaseOptions
+FaceLandmarker = mp.tasks.vision.FaceLandmarker
+FaceLandmarkerOptions = mp.tasks.vision.FaceLandmarkerOptions
+FaceLandmarkerResult = mp.tasks.vision.FaceLandmarkerResult
+VisionRunningMode = mp.tasks.vision.RunningMode
+
+FRAME_QUEUE_SIZE = 8  # signal frames buffered for frames() generator
+
+
+@dataclass
+class PipelineConfig:
+    """
+    Settings of one face pipeline, mirrors keys of face_config.json.
+    """
+
+    server_ip: str = "127.0.0.1"
+    server_port: int = 4242
+    group_id: int = 0
+    boolean_msg: bool = True
+    show_camera: bool = False
+    closed_eyes_time: float = fe.CLOSED_TIME
+    # signal name -> code used in messages for game
+    signal_codes: Dict[str, int] = field(
+        default_factory=lambda: {name: i + 1 for i, name in enumerate(SIGNAL_NAMES)}
+    )
+    latency_control: bool = False
+    latency_target_ms: float = 60
+    roi_tracking: bool = False
+    prediction: bool = False
+    prediction_horizon_ms: float = 100
+    prediction_gate: float = 3.0
+    probe: bool = False
+    metrics_interval: float = 10
+    model_path: str = "face_landmarker.task"
+    # model settings, see benchmark.py for choosing them
+    input_scale: float = 1.0
+    running_mode: str = "LIVE_STREAM"
+    num_faces: int = 1
+    delegate: str = "CPU"
+
+    @classmethod
+    def from_dict(cls, face_config: Dict[str, Any]) -> "PipelineConfig":
+        """
+        Creates config from the content of face_config.json. Keys added after
+        the first version of the config are optional, so older configs still work.
+        Args:
+            face_config (Dict[str, Any]): Loaded json config.
+        Returns:
+            PipelineConfig: Pipeline settings.
+        """
+        defaults = cls()
+        return cls(
+            server_ip=face_config["SERVER_IP"],
+            server_port=face_config["SERVER_PORT"],
+            group_id=face_config["GROUP_ID"],
+            boolean_msg=bool(face_config["BOOLEAN_MSG"]),
+            show_camera=bool(face_config["SHOW_CAMERA"]),
+            closed_eyes_time=face_config["CLOSED_EYES_TIME"],
+            signal_codes={name: face_config[name] for name in SIGNAL_NAMES},
+            latency_control=bool(face_config.get("LATENCY_CONTROL", defaults.latency_control)),
+            latency_target_ms=face_config.get("LATENCY_TARGET_MS", defaults.latency_target_ms),
+            roi_tracking=bool(face_config.get("ROI_TRACKING", defaults.roi_tracking)),
+            prediction=bool(face_config.get("PREDICTION", defaults.prediction)),
+            prediction_horizon_ms=face_config.get(
+                "PREDICTION_HORIZON_MS", defaults.prediction_horizon_ms
+            ),
+            prediction_gate=face_config.get("PREDICTION_GATE", defaults.prediction_gate),
+            probe=bool(face_config.get("PROBE", defaults.probe)),
+            metrics_interval=face_config.get("METRICS_INTERVAL", defaults.metrics_interval),
+            input_scale=face_config.get("INPUT_SCALE", defaults.input_scale),
+            running_mode=face_config.get("RUNNING_MODE", defaults.running_mode),
+            num_faces=face_config.get("NUM_FACES", defaults.num_faces),
+            delegate=face_config.get("DELEGATE", defaults.delegate),
+        )
+
+
+@dataclass
+class SignalFrame:
+    """
+    Signals detected on one frame together with its timing.
+
+    Attributes:
+        group_id (int): Group of the pipeline which produced the frame.
+        sequence (int): Number of the frame given when it was captured.
+        timestamp_ms (int): Timestamp passed to detect_async for this frame.
+        capture_time (float): time.monotonic() value when the frame was read.
+        completion_time (float): time.monotonic() value when the model returned the result.
+        signal_time (float): time.monotonic() value when the signals were computed.
+        landmarks (List[NormalizedLandmark]): Face landmarks in full frame coordinates,
+            extrapolated to signal_time when prediction is enabled.
+        EYE_CHARGING ... IS_DOWN (bool): Values of signals listed in SIGNAL_NAMES.
+    """
+
+    group_id: int
+    sequence: int
+    timestamp_ms: int
+    capture_time: float
+    completion_time: float
+    signal_time: float
+    landmarks: List[Any]
+    EYE_CHARGING: bool = False
+    EYE_FAILED: bool = False
+    EYE_ACTIVATION: bool = False
+    MOUTH_OPENED: bool = False
+    SMILE: bool = False
+    IS_RIGHT: bool = False
+    IS_LEFT: bool = False
+    IS_UP: bool = False
+    IS_DOWN: bool = False
+
+    @property
+    def latency(self) -> float:
+        """
+        Returns the capture to signal time of the frame in seconds.
+        """
+        return self.signal_time - self.capture_time
+
+    def signals(self) -> Dict[str, bool]:
+        """
+        Returns signal name -> value for all SIGNAL_NAMES.
+        """
+        return {name: getattr(self, name) for name in SIGNAL_NAMES}
+
+
+class FacePipeline:
+    """
+    Face landmarks pipeline turning frames of a source into SignalFrames.
+
+    Frames are read from the source (any object with cv2.VideoCapture like
+    read() method) and passed to the model in LIVE_STREAM or VIDEO mode, signals
+    are computed in a worker thread and passed to every subscribed callback.
+    Signal frames can be also consumed with frames() generator. Every pipeline
+    keeps its own state, so several of them may run in one process.
+    """
+
+    def __init__(self, config: PipelineConfig, source):
+        self.config = config
+        self.source = source
+
+        # handoff of results from MediaPipe's callback thread to the signal worker;
+        # the latest taken result is also used for visualization
+        self.result_slot = ResultSlot()
+
+        # controller adapting inference resolution and frame skipping so the
+        # capture to signal latency stays below latency_target_ms
+        self.latency_controller = None
+        if config.latency_control:
+            self.latency_controller = LatencyController(config.latency_target_ms)
+
+        # tracker of the face region, so only the part of the frame around
+        # the face found in previous result is converted and passed to the model
+        self.roi_tracker = RoiTracker() if config.roi_tracking else None
+
+        # optional extrapolation of the face motion over the pipeline latency
+        self.predictor = None
+        if config.prediction:
+            self.predictor = HeadMotionPredictor(
+                config.prediction_horizon_ms, config.prediction_gate
+            )
+
+        # state of the detectors, center is estimation of face center point
+        self.center = None
+        self.eyes_state = types.SimpleNamespace()
+
+        self._subscribers: List[Callable[[SignalFrame], None]] = []
+        self._subscribers_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._worker = None
+
+    def subscribe(self, callback: Callable[[SignalFrame], None]) -> Callable[[], None]:
+        """
+        Registers callback (sink) called from the worker thread with every SignalFrame.
+        Args:
+            callback (Callable[[SignalFrame], None]): Function receiving signal frames.
+        Returns:
+            Callable[[], None]: Function removing the subscription.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._subscribers_lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Runs the pipeline in a background thread.
+        """
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the pipeline and waits for it if it runs in background.
+        """
+        self._stop_event.set()
+
+        # called from inside of the pipeline, e.g. by a subscriber - nothing to wait for
+        if threading.current_thread() in (self._thread, self._worker):
+            return
+        if self._thread is not None:
+            self._thread.join()
+
+    def frames(self) -> Iterator[SignalFrame]:
+        """
+        Generator of signal frames, starts the pipeline in background if needed
+        and stops it again when the consumer stops iterating.
+        When the consumer is too slow the oldest frames are dropped.
+        """
+        frame_queue = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+
+        def put(frame: SignalFrame) -> None:
+            while True:
+                try:
+                    frame_queue.put_nowait(frame)
+                    return
+                except queue.Full:
+                    try:
+                        frame_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+        unsubscribe = self.subscribe(put)
+        started = not self.running
+        self.start()
+        try:
+            while True:
+                try:
+                    yield frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    if not self.running:
+                        return
+        finally:
+            unsubscribe()
+            if started:
+                self.stop()
+
+    def run(self) -> None:
+        """
+        Main pipeline loop, reads frames from the source until it ends or stop()
+        is called. Blocks the calling thread.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        # start() clears the event before starting the thread itself, clearing it
+        # here would lose stop() called before the thread got to run
+        if threading.current_thread() is not self._thread:
+            self._stop_event.clear()
+
+        # initializing FaceLandmarker model options
+        # in VIDEO mode the model runs in this thread and results are published directly
+        live_stream = self.config.running_mode == "LIVE_STREAM"
+        options = FaceLandmarkerOptions(
+            base_options=BaseOptions(
+                model_asset_path=self.config.model_path,
+                delegate=BaseOptions.Delegate[self.config.delegate],
+            ),
+            running_mode=VisionRunningMode[self.config.running_mode],
+            num_faces=self.config.num_faces,
+            result_callback=self._on_result if live_stream else None,
+        )
+
+        # index of frame read from source used for frame skipping
+        frame_index = 0
+        last_timestamp_ms = -1
+
+        # creating a main loop with model as a landmarker object
+        with contextlib.ExitStack() as landmarkers:
+            landmarker = landmarkers.enter_context(FaceLandmarker.create_from_options(options))
+
+            # cropped frames go to a separate landmarker in IMAGE mode - in LIVE_STREAM
+            # and VIDEO mode the model tracks the face using its rectangle in the previous
+            # input, which points to a wrong place whenever the crop region changes
+            roi_landmarker = None
+            if self.roi_tracker is not None:
+                roi_options = FaceLandmarkerOptions(
+                    base_options=options.base_options,
+                    running_mode=VisionRunningMode.IMAGE,
+                    num_faces=self.config.num_faces,
+                )
+                roi_landmarker = landmarkers.enter_context(
+                    FaceLandmarker.create_from_options(roi_options)
+                )
+
+            # starting the worker which turns results into signals
+            self._worker = threading.Thread(target=self._signal_worker, daemon=True)
+            self._worker.start()
+
+            while not self._stop_event.is_set():
+                try:
+                    # receiving frames from source
+                    ret, frame = self.source.read()
+                    capture_time = time.monotonic()
+
+                    if not ret:
+                        print("Failed to capture frame. Exiting...")
+                        break
+
+                    frame_index += 1
+                    mp_image, roi = self._prepare_input(frame, frame_index)
+                    if mp_image is None:
+                        continue
+
+                    # registering the frame so its result can be matched in the callback;
+                    # timestamp comes from the same monotonic clock as capture time
+                    # and has to grow for every frame passed to the model
+                    timestamp_ms = max(int(capture_time * 1000), last_timestamp_ms + 1)
+                    last_timestamp_ms = timestamp_ms
+                    self.result_slot.register_frame(timestamp_ms, capture_time, roi)
+
+                    # detection landmarks on given frame (as mp.Image object)
+                    if roi is not None:
+                        result = roi_landmarker.detect(mp_image)
+                        self.result_slot.publish(result, timestamp_ms, synchronous=True)
+                    elif live_stream:
+                        landmarker.detect_async(mp_image, timestamp_ms)
+                    else:
+                        result = landmarker.detect_for_video(mp_image, timestamp_ms)
+                        self.result_slot.publish(result, timestamp_ms, synchronous=True)
+
+                    # displaying the output with landmarks if show_camera is set
+                    if self.config.show_camera and not self._show(frame):
+                        break
+
+                except Exception as e:
+                    print(f"Unhandled exception: {e}")
+
+            if self.config.show_camera:
+                cv2.destroyAllWindows()
+
+        # stopping the worker after the model won't produce any more results
+        self._stop_event.set()
+        self._worker.join()
+
+        self.print_metrics()
+
+    def _prepare_input(self, frame, frame_index: int):
+        """
+        Crops, scales and converts camera frame into model input.
+        Args:
+            frame (numpy.ndarray): BGR frame from the source.
+            frame_index (int): Index of the frame read from the source.
+        Returns:
+            Tuple[mp.Image, Roi]: Model input and the region it was cropped from,
+                (None, None) if the frame shall be skipped.
+        """
+        model_input = frame
+        roi = None
+
+        # skipping frames when pipeline can't keep up with the target
+        if self.latency_controller is not None:
+            if not self.latency_controller.should_process(frame_index):
+                return None, None
+
+        # cropping the frame to the tracked face region before conversion
+        if self.roi_tracker is not None:
+            roi = self.roi_tracker.region(frame.shape[1], frame.shape[0])
+            if roi is not None:
+                model_input = roi.crop(frame)
+
+        # landmarks are normalized, so smaller input doesn't change signals
+        scale = self.config.input_scale
+        if self.latency_controller is not None:
+            scale *= self.latency_controller.scale
+        if scale < 1.0:
+            model_input = cv2.resize(
+                model_input, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA
+            )
+
+        # parsing BGR to RGB due to model standard
+        frame_rgb = cv2.cvtColor(model_input, cv2.COLOR_BGR2RGB)
+
+        # parsing rbg frame into mp.Image object
+        return mp.Image(image_format=mp.ImageFormat.SRGB, data=frame_rgb), roi
+
+    def _show(self, frame) -> bool:
+        """
+        Displays landmarks of the latest result, returns False when user pressed q.
+        """
+        detection_result = self.result_slot.latest()
+        if detection_result is None:
+            return True
+
+        frame = 0 * frame
+        cv2.imshow(
+            f"Camera {self.config.group_id}",
+            sf.draw_landmarks_on_image(frame, detection_result.result),
+        )
+        return cv2.waitKey(1) != ord("q")
+
+    def _on_result(
+        self, result: FaceLandmarkerResult, output_image: mp.Image, timestamp_ms: int  # type: ignore
+    ) -> None:
+        """
+        Callback function for the MediaPipe FaceLandmarker model.
+        It runs on MediaPipe's internal thread, so it only hands the result over
+        to the signal worker through the result slot and returns immediately.
+
+        Args:
+            result (FaceLandmarkerResult): The result of the face landmarks detection.
+            output_image (mp.Image): A default parameter required for FaceLandmarkerResult processing.
+            timestamp_ms (int): Timestamp of the frame passed to detect_async.
+
+        Returns:
+            None
+        """
+        self.result_slot.publish(result, timestamp_ms)
+
+    def _signal_worker(self) -> None:
+        """
+        Worker thread function which takes the newest results from the result slot,
+        computes signals and passes them to subscribers until the pipeline stops.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        metrics_interval = self.config.metrics_interval
+        last_metrics_t = time.monotonic()
+
+        while not self._stop_event.is_set():
+            frame_result = self.result_slot.take(timeout=0.1)
+
+            if metrics_interval and time.monotonic() - last_metrics_t >= metrics_interval:
+                last_metrics_t = time.monotonic()
+                self.print_metrics()
+
+            # none avoidance for timeout and initialization of camera
+            if frame_result is None or frame_result.result is None:
+                continue
+
+            if self.roi_tracker is not None:
+                # mapping landmarks of the cropped frame back to the full frame,
+                # so detectors receive the same coordinates as without cropping
+                if frame_result.roi is not None:
+                    frame_result.result.face_landmarks = [
+                        frame_result.roi.to_frame(landmarks)
+                        for landmarks in frame_result.result.face_landmarks
+                    ]
+                face_landmarks = frame_result.result.face_landmarks
+                self.roi_tracker.update(face_landmarks[0] if face_landmarks else None)
+
+            signal_frame = self.detect_signals(frame_result)
+            if signal_frame is not None:
+                self._notify(signal_frame)
+
+            # capture to signal latency drives the quality of next frames
+            if self.latency_controller is not None:
+                latency_ms = (time.monotonic() - frame_result.capture_time) * 1000
+                self.latency_controller.record(latency_ms)
+
+    def detect_signals(self, frame_result: FrameResult) -> Optional[SignalFrame]:
+        """
+        Analyzes facial expressions of the first detected face.
+        Called only from the signal worker thread.
+
+        Args:
+            frame_result (FrameResult): Result of the face landmarks detection with
+                landmarks in full frame coordinates.
+
+        Returns:
+            SignalFrame: Detected signals or None if there is no face.
+        """
+        result = frame_result.result
+
+        # if no face landmarks detected do not pass it to the function to avoid exiting app
+        if not result.face_landmarks:
+            return None
+        landmarks = result.face_landmarks[0]
+        signal_time = time.monotonic()
+
+        try:
+            # moving landmarks to where the face is expected to be now
+            if self.predictor is not None:
+                landmarks = self.predictor.predict(
+                    landmarks, frame_result.capture_time, signal_time
+                )
+
+            # receiving bool value about eyes test signal
+            just_closed, opened_too_fast, activate_action = fe.check_eyes_closed(
+                landmarks, self.eyes_state, self.config.closed_eyes_time
+            )
+
+            # receiving bool value about mouth
+            opened_mouth, smile = fe.detect_smile_and_open_mouth(landmarks)
+
+            # receiving bool value about face movement
+            (is_left, is_right, is_up, is_down), self.center = fe.detect_head_movement(
+                landmarks, self.center
+            )
+        except Exception as e:
+            print(f"Unhandled exception in FacePipeline.detect_signals function: {e}")
+            return None
+
+        return SignalFrame(
+            group_id=self.config.group_id,
+            sequence=frame_result.sequence,
+            timestamp_ms=frame_result.timestamp_ms,
+            capture_time=frame_result.capture_time,
+            completion_time=frame_result.completion_time,
+            signal_time=signal_time,
+            landmarks=landmarks,
+            EYE_CHARGING=just_closed,
+            EYE_FAILED=opened_too_fast,
+            EYE_ACTIVATION=activate_action,
+            MOUTH_OPENED=opened_mouth,
+            SMILE=smile,
+            IS_RIGHT=is_right,
+            IS_LEFT=is_left,
+            IS_UP=is_up,
+            IS_DOWN=is_down,
+        )
+
+    def _notify(self, signal_frame: SignalFrame) -> None:
+        """
+        Passes signal frame to all subscribers, one failing subscriber doesn't stop others.
+        """
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(signal_frame)
+            except Exception as e:
+                print(f"Unhandled exception in FacePipeline subscriber: {e}")
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns snapshot of counters of the result slot and enabled pipeline parts.
+        """
+        metrics = {"slot": self.result_slot.stats()}
+        if self.latency_controller is not None:
+            metrics["latency"] = self.latency_controller.stats()
+        if self.roi_tracker is not None:
+            metrics["roi"] = self.roi_tracker.stats()
+        if self.predictor is not None:
+            metrics["prediction"] = self.predictor.stats()
+        return metrics
+
+    def print_metrics(self) -> None:
+        """
+        Prints counters of the result slot and enabled pipeline parts.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        metrics = self.metrics()
+
+        stats = metrics["slot"]
+        print(
+            f"Frames submitted: {stats['submitted']}, dropped by model: {stats['dropped']}, "
+            f"superseded: {stats['superseded']}, processed: {stats['consumed']}"
+        )
+        if "latency" in metrics:
+            print(
+                "Latency: "
+                + ", ".join(
+                    f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}"
+                    for key, value in metrics["latency"].items()
+                )
+            )
+        if "roi" in metrics:
+            stats = metrics["roi"]
+            print(
+                f"ROI frames: {stats['frames']}, tracking lost: {stats['lost']}, "
+                f"processed pixels: {stats['pixel_ratio']:.1%}"
+            )
+        if "prediction" in metrics:
+            stats = metrics["prediction"]
+            print(
+                f"Prediction: {stats['predicted']}/{stats['frames']} frames, "
+                f"gated: {stats['gated']}, horizon: {stats['horizon_ms']:.1f} ms, "
+                f"center error: {stats['center_error']:.4f} "
+                f"(lagging {stats['center_lag_error']:.4f}), "
+                f"mouth error: {stats['mouth_error']:.4f} "
+                f"(lagging {stats['mouth_lag_error']:.4f})"
+            )
@@ -0,0 +1,267 @@
+import math
+import threading
+from typing import Dict, List, Tuple
+from mediapipe.tasks.python.components.containers.landmark import NormalizedLandmark
+
+HORIZON_MS = 100  # maximal time the signals are extrapolated for
+GATE = 3.0  # innovation (in standard deviations) above which prediction is not trusted
+WARMUP = 3  # measurements needed before velocity is trusted
+MATCH_TIME = 0.05  # [s] maximal distance of frames from predicted time used for evaluation
+
+# Noise of the filters for (measurement std, acceleration std) in normalized units
+CENTER_NOISE = (0.002, 5.0)
+MOUTH_NOISE = (0.003, 2.0)
+
+# Lips used for mouth opening, same as in faceexpressions.detect_smile_and_open_mouth
+TOP_LIP = 12
+BOTTOM_LIP = 14
+
+
+class ConstantVelocityKalman:
+    """
+    One dimensional Kalman filter with constant velocity model and variable time step.
+    """
+
+    def __init__(self, measurement_std: float, acceleration_std: float):
+        self.r = measurement_std**2
+        self.q = acceleration_std**2
+        self.position = None
+        self.velocity = 0.0
+        self.time = None
+        self.updates = 0
+        # covariance [[p00, p01], [p10, p11]]
+        self.p = [[self.r, 0.0], [0.0, 1.0]]
+
+    def reset(self, z: float, t: float) -> None:
+        self.position = z
+        self.velocity = 0.0
+        self.time = t
+        self.updates = 1
+        self.p = [[self.r, 0.0], [0.0, 1.0]]
+
+    def update(self, z: float, t: float) -> float:
+        """
+        Adds measurement to the filter.
+        Args:
+            z (float): Measured value.
+            t (float): Time of the measurement in seconds.
+        Returns:
+            float: Innovation normalized by its standard deviation.
+        """
+        if self.position is None:
+            self.reset(z, t)
+            return 0.0
+
+        dt = max(t - self.time, 0.0)
+
+        # prediction step
+        position = self.position + self.velocity * dt
+        (p00, p01), (p10, p11) = self.p
+        p00 = p00 + dt * (p10 + p01) + dt * dt * p11 + self.q * dt**4 / 4
+        p01 = p01 + dt * p11 + self.q * dt**3 / 2
+        p10 = p10 + dt * p11 + self.q * dt**3 / 2
+        p11 = p11 + self.q * dt**2
+
+        # update step
+        s = p00 + self.r
+        k0 = p00 / s
+        k1 = p10 / s
+        innovation = z - position
+
+        self.position = position + k0 * innovation
+        self.velocity += k1 * innovation
+        self.p = [
+            [(1 - k0) * p00, (1 - k0) * p01],
+            [p10 - k1 * p00, p11 - k1 * p01],
+        ]
+        self.time = t
+        self.updates += 1
+        return innovation / math.sqrt(s)
+
+    def predict(self, t: float) -> float:
+        """
+        Returns value extrapolated to time t.
+        """
+        return self.position + self.velocity * (t - self.time)
+
+
+class HeadMotionPredictor:
+    """
+    Extrapolates face centroid and mouth opening from capture time of the frame
+    to the current time, so the signals don't lag behind fast head movements
+    by the capture and inference time.
+
+    Eye signals depend on durations of closing and are not predicted; eye
+    ratios don't change with the applied shift. Prediction is skipped when the
+    measurement doesn't fit the filter (innovation above gate), e.g. after
+    the face was lost.
+
+    Every prediction is compared with the value interpolated between frames
+    later captured around the predicted time, together with the error of the
+    unpredicted (lagging) value, which gives the accuracy versus lag trade-off
+    in stats().
+    """
+
+    def __init__(self, horizon_ms: float = HORIZON_MS, gate: float = GATE):
+        self.horizon = horizon_ms / 1000
+        self.gate = gate
+        self.filters = {
+            "x": ConstantVelocityKalman(*CENTER_NOISE),
+            "y": ConstantVelocityKalman(*CENTER_NOISE),
+            "mouth": ConstantVelocityKalman(*MOUTH_NOISE),
+        }
+        self._lock = threading.Lock()
+
+        # (target time, predicted values, measured values) waiting for evaluation
+        self._pending: List[Tuple[float, Dict[str, float], Dict[str, float]]] = []
+        self._last = (-math.inf, None)  # (capture time, measured values) of previous frame
+
+        # counters
+        self.frames = 0
+        self.predicted = 0
+        self.gated = 0
+        self.horizon_sum = 0.0
+        self.evaluated = 0
+        self.error_sum = {"center": 0.0, "mouth": 0.0}
+        self.lag_error_sum = {"center": 0.0, "mouth": 0.0}
+
+    def predict(
+        self, landmarks: List[NormalizedLandmark], capture_time: float, now: float
+    ) -> List[NormalizedLandmark]:
+        """
+        Returns landmarks moved to the position extrapolated for the current time.
+        Args:
+            landmarks (List[NormalizedLandmark]): Landmarks of the frame in full frame coordinates.
+            capture_time (float): time.monotonic() value when the frame was captured.
+            now (float): Current time.monotonic() value.
+        Returns:
+            List[NormalizedLandmark]: Predicted landmarks, or unchanged ones when the
+                prediction is not trusted.
+        """
+        measured = self.measure(landmarks)
+
+        with self._lock:
+            self.frames += 1
+            self._evaluate(measured, capture_time)
+
+            innovations = [
+                abs(self.filters[name].update(value, capture_time))
+                for name, value in measured.items()
+            ]
+
+            if max(innovations) > self.gate:
+                # measurement doesn't follow the motion - starting from it again
+                for name, value in measured.items():
+                    self.filters[name].reset(value, capture_time)
+                self.gated += 1
+                return landmarks
+            if any(f.updates < WARMUP for f in self.filters.values()):
+                return landmarks
+
+            horizon = min(max(now - capture_time, 0.0), self.horizon)
+            target_time = capture_time + horizon
+            predicted = {
+                name: f.predict(target_time) for name, f in self.filters.items()
+            }
+            self._pending.append((target_time, predicted, measured))
+            self.predicted += 1
+            self.horizon_sum += horizon
+
+        return self.apply(landmarks, measured, predicted)
+
+    @staticmethod
+    def measure(landmarks: List[NormalizedLandmark]) -> Dict[str, float]:
+        """
+        Returns predicted quantities of the landmarks: centroid and mouth opening.
+        """
+        top, bottom = landmarks[TOP_LIP], landmarks[BOTTOM_LIP]
+        return {
+            "x": sum([landmark.x for landmark in landmarks]) / len(landmarks),
+            "y": sum([landmark.y for landmark in landmarks]) / len(landmarks),
+            "mouth": math.hypot(top.x - bottom.x, top.y - bottom.y),
+        }
+
+    @staticmethod
+    def apply(
+        landmarks: List[NormalizedLandmark],
+        measured: Dict[str, float],
+        predicted: Dict[str, float],
+    ) -> List[NormalizedLandmark]:
+        """
+        Moves landmarks by the predicted centroid shift and opens or closes
+        the lips symmetrically to the predicted mouth opening.
+        """
+        dx = predicted["x"] - measured["x"]
+        dy = predicted["y"] - measured["y"]
+        moved = [
+            NormalizedLandmark(
+                x=landmark.x + dx,
+                y=landmark.y + dy,
+                z=landmark.z,
+                visibility=landmark.visibility,
+                presence=landmark.presence,
+            )
+            for landmark in landmarks
+        ]
+
+        if measured["mouth"] > 0:
+            top, bottom = moved[TOP_LIP], moved[BOTTOM_LIP]
+            mid_x, mid_y = (top.x + bottom.x) / 2, (top.y + bottom.y) / 2
+            ratio = max(predicted["mouth"], 0.0) / measured["mouth"]
+            for lip in (top, bottom):
+                lip.x = mid_x + (lip.x - mid_x) * ratio
+                lip.y = mid_y + (lip.y - mid_y) * ratio
+
+        return moved
+
+    def _evaluate(self, measured: Dict[str, float], capture_time: float) -> None:
+        """
+        Compares pending predictions with the value interpolated between
+        the frames captured around their target time.
+        """
+        pending = []
+        for target_time, predicted, lagged in self._pending:
+            if capture_time < target_time:
+                pending.append((target_time, predicted, lagged))
+                continue
+
+            last_time, last = self._last
+            if capture_time - last_time > MATCH_TIME * 2 or last_time > target_time:
+                # no frames captured close enough to the target time
+                continue
+
+            w = (target_time - last_time) / (capture_time - last_time)
+            truth = {
+                name: last[name] + (measured[name] - last[name]) * w for name in measured
+            }
+
+            self.evaluated += 1
+            for values, sums in ((predicted, self.error_sum), (lagged, self.lag_error_sum)):
+                sums["center"] += math.hypot(
+                    values["x"] - truth["x"], values["y"] - truth["y"]
+                )
+                sums["mouth"] += abs(values["mouth"] - truth["mouth"])
+
+        self._pending = pending
+        self._last = (capture_time, measured)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns prediction counters and mean errors of predicted and lagging
+        values in normalized frame units.
+        """
+        with self._lock:
+            evaluated = self.evaluated or math.nan
+            return {
+                "frames": self.frames,
+                "predicted": self.predicted,
+                "gated": self.gated,
+                "horizon_ms": (
+                    self.horizon_sum / self.predicted * 1000 if self.predicted else 0.0
+                ),
+                "evaluated": self.evaluated,
+                "center_error": self.error_sum["center"] / evaluated,
+                "center_lag_error": self.lag_error_sum["center"] / evaluated,
+                "mouth_error": self.error_sum["mouth"] / evaluated,
+                "mouth_lag_error": self.lag_error_sum["mouth"] / evaluated,
+            }
@@ -0,0 +1,140 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Tuple
+
+# Steps of pipeline quality ordered from the most to the least expensive one,
+# each step is (scale of the inference input, process every n-th frame)
+LATENCY_STEPS = [
+    (1.0, 1),
+    (0.75, 1),
+    (0.5, 1),
+    (0.5, 2),
+    (0.35, 2),
+    (0.35, 3),
+]
+
+WINDOW_SIZE = 60  # number of latency samples used for one decision
+RECOVER_RATIO = 0.7  # step up only when percentile is below this part of target
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Returns the q-th percentile of values using the nearest rank method.
+    Args:
+        values (List[float]): Samples, don't have to be sorted.
+        q (float): Percentile in range [0, 100].
+    Returns:
+        float: Value of the percentile or NaN for no samples.
+    """
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyController:
+    """
+    Closed loop controller which holds the capture to signal latency below target
+    by stepping the inference input resolution and frame skipping through LATENCY_STEPS.
+
+    Latency samples are recorded by the signal worker, while the main loop reads
+    current scale and frame skip, so the state is guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        target_ms: float,
+        q: float = 95,
+        window_size: int = WINDOW_SIZE,
+        steps: List[Tuple[float, int]] = LATENCY_STEPS,
+    ):
+        self.target_ms = target_ms
+        self.q = q
+        self.steps = steps
+        self.step = 0
+        self.changes = 0
+        self.skipped = 0
+        self.last_percentile_ms = math.nan
+        self._samples = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    @property
+    def scale(self) -> float:
+        """
+        Returns the current scale of the inference input.
+        """
+        return self.steps[self.step][0]
+
+    @property
+    def frame_skip(self) -> int:
+        """
+        Returns the current frame skip ratio, 1 means every frame is processed.
+        """
+        return self.steps[self.step][1]
+
+    def should_process(self, frame_index: int) -> bool:
+        """
+        Decides whether the frame with given index shall be passed to the model.
+        Args:
+            frame_index (int): Index of the frame read from camera.
+        Returns:
+            bool: True if frame should be processed.
+        """
+        with self._lock:
+            if frame_index % self.frame_skip == 0:
+                return True
+            self.skipped += 1
+            return False
+
+    def record(self, latency_ms: float) -> None:
+        """
+        Adds latency sample and moves one step down or up once the window is full.
+        Args:
+            latency_ms (float): Capture to signal latency of one frame in milliseconds.
+        Returns:
+            None
+        """
+        with self._lock:
+            self._samples.append(latency_ms)
+            if len(self._samples) < self._samples.maxlen:
+                return
+
+            value = percentile(self._samples, self.q)
+            self.last_percentile_ms = value
+
+            new_step = self.step
+            if value > self.target_ms and self.step < len(self.steps) - 1:
+                new_step = self.step + 1
+            elif value < self.target_ms * RECOVER_RATIO and self.step > 0:
+                new_step = self.step - 1
+            else:
+                return
+
+            print(
+                f"Latency p{self.q:g} {value:.1f} ms (target {self.target_ms:g} ms): "
+                f"step {self.step} -> {new_step}, "
+                f"scale {self.steps[new_step][0]}, frame skip {self.steps[new_step][1]}"
+            )
+            self.step = new_step
+            self.changes += 1
+            # samples taken with previous settings shouldn't affect next decision
+            self._samples.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns snapshot of the controller state and measured latency.
+        """
+        with self._lock:
+            samples = list(self._samples)
+            return {
+                "step": self.step,
+                "scale": self.scale,
+                "frame_skip": self.frame_skip,
+                "changes": self.changes,
+                "skipped": self.skipped,
+                "p50_ms": percentile(samples, 50),
+                f"p{self.q:g}_ms": percentile(samples, self.q),
+                "last_decision_ms": self.last_percentile_ms,
+            }
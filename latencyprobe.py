@@ -0,0 +1,222 @@
+import argparse
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+
+from latencycontrol import percentile
+
+# Probe of end to end latency. In probe mode every message sent by UdpSink
+# gets suffix "#{sequence}:{capture_us}" with the packet sequence number of the
+# station and monotonic capture time of its frame in microseconds. The game server (or the echo
+# stand-in below) returns tagged packets to their sender, which gives round
+# trip time and capture to game latency (capture to send + half of round trip):
+#
+#   python latencyprobe.py --port 4242 --forward 192.168.0.109:4243
+#
+# Echo has to receive packets of stations directly - packets passing through
+# relay.py are echoed to the relay, not to the stations.
+
+PROBE_SEPARATOR = "#"
+HISTORY_SIZE = 1000  # samples kept for percentiles
+SENT_SIZE = 1024  # sent packets waiting for echo
+
+
+def tag_msg(msg: str, sequence: int, capture_time: float) -> str:
+    """
+    Appends probe tag to the message.
+    Args:
+        msg (str): Message for game.
+        sequence (int): Sequence number of the packet.
+        capture_time (float): time.monotonic() value when the frame was captured.
+    Returns:
+        str: Tagged message.
+    """
+    return f"{msg}{PROBE_SEPARATOR}{sequence}:{int(capture_time * 1e6)}"
+
+
+def split_probe(msg: str) -> Tuple[str, Optional[int], Optional[float]]:
+    """
+    Splits tagged message into message, sequence and capture time.
+    Returns:
+        Tuple[str, int, float]: Message without tag, sequence number and capture time
+            in seconds; None for both for messages without tag.
+    """
+    msg, separator, tag = msg.partition(PROBE_SEPARATOR)
+    if not separator:
+        return msg, None, None
+    try:
+        sequence, capture_us = tag.split(":")
+        return msg, int(sequence), int(capture_us) / 1e6
+    except ValueError:
+        return msg, None, None
+
+
+class LatencyProbe:
+    """
+    Tags outgoing messages and measures latency of their echoes received on the
+    same socket in a background thread; the distributions are printed every
+    report_interval seconds.
+    """
+
+    def __init__(self, udp_socket: socket.socket, report_interval: float = 10):
+        self.udp_socket = udp_socket
+        self.report_interval = report_interval
+        # packet sequence -> time.monotonic() of sending
+        self._sent: OrderedDict = OrderedDict()
+        self._next_sequence = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.rtt = deque(maxlen=HISTORY_SIZE)
+        self.capture_to_send = deque(maxlen=HISTORY_SIZE)
+        self.capture_to_game = deque(maxlen=HISTORY_SIZE)
+        self.tagged = 0
+        self.echoed = 0
+
+    def tag(self, msg: str, capture_time: float) -> str:
+        """
+        Tags the message with the next packet sequence number and remembers when
+        it was sent. Every packet is numbered, so gaps in the sequence seen by the
+        receiver are lost packets.
+        """
+        with self._lock:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            self._sent[sequence] = time.monotonic()
+            if len(self._sent) > SENT_SIZE:
+                self._sent.popitem(last=False)
+            self.tagged += 1
+        return tag_msg(msg, sequence, capture_time)
+
+    def start(self) -> None:
+        """
+        Starts receiving echoes in a background thread.
+        """
+        # echoes come back to the port of the socket, which has to be bound to receive
+        self.udp_socket.bind(("0.0.0.0", 0))
+        self.udp_socket.settimeout(0.1)
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _receive(self) -> None:
+        next_report = time.monotonic() + self.report_interval
+        while not self._stop_event.is_set():
+            try:
+                data, _ = self.udp_socket.recvfrom(4096)
+            except socket.timeout:
+                data = None
+            except ConnectionResetError:
+                # echo not running, reported by some systems for UDP
+                continue
+            except OSError:
+                # socket closed
+                return
+
+            now = time.monotonic()
+            if data is not None:
+                self.receive_echo(data.decode("ascii", errors="replace"), now)
+
+            if self.report_interval and now >= next_report:
+                next_report = now + self.report_interval
+                self.print_report()
+
+    def receive_echo(self, msg: str, now: float) -> None:
+        """
+        Records latency of the echoed message.
+        """
+        _, sequence, capture_time = split_probe(msg)
+        if sequence is None:
+            return
+
+        with self._lock:
+            sent_time = self._sent.get(sequence)
+            if sent_time is None:
+                return
+            rtt = now - sent_time
+            self.rtt.append(rtt * 1000)
+            self.capture_to_send.append((sent_time - capture_time) * 1000)
+            self.capture_to_game.append((sent_time - capture_time + rtt / 2) * 1000)
+            self.echoed += 1
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns counters and percentiles of the latencies in milliseconds.
+        """
+        with self._lock:
+            stats = {"tagged": self.tagged, "echoed": self.echoed}
+            for name, values in (
+                ("rtt", self.rtt),
+                ("capture_to_send", self.capture_to_send),
+                ("capture_to_game", self.capture_to_game),
+            ):
+                values = list(values)
+                for q in (50, 95, 99):
+                    stats[f"{name}_p{q}_ms"] = percentile(values, q)
+            return stats
+
+    def print_report(self) -> None:
+        stats = self.stats()
+        print(
+            f"Probe: tagged {stats['tagged']}, echoed {stats['echoed']}, "
+            + ", ".join(
+                f"{name} p50/p95/p99 {stats[f'{name}_p50_ms']:.1f}/"
+                f"{stats[f'{name}_p95_ms']:.1f}/{stats[f'{name}_p99_ms']:.1f} ms"
+                for name in ("capture_to_send", "rtt", "capture_to_game")
+            )
+        )
+
+
+def echo_proc(port: int, forward: Tuple[str, int] = None) -> None:
+    """
+    Local stand-in of game server returning tagged packets to their sender.
+
+    Args:
+        port (int): Port the stations send to.
+        forward (Tuple[str, int]): Address of the real game server receiving
+            every packet without tag, None if nothing should be forwarded.
+
+    Returns:
+        None
+    """
+    udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    udp_socket.bind(("0.0.0.0", port))
+    print(f"Echoing probe packets on port {port}")
+
+    echoed = 0
+    try:
+        while True:
+            data, address = udp_socket.recvfrom(4096)
+            if PROBE_SEPARATOR.encode("ascii") in data:
+                udp_socket.sendto(data, address)
+                echoed += 1
+            if forward is not None:
+                # game server gets the messages without tags
+                msg, _, _ = split_probe(data.decode("ascii", errors="replace"))
+                udp_socket.sendto(msg.encode("ascii"), forward)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        udp_socket.close()
+        print(f"Echoed packets: {echoed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Echo stand-in of game server for latency probe")
+    parser.add_argument("--port", type=int, default=4242, help="port the stations send to")
+    parser.add_argument("--forward", help="ip:port of game server receiving all packets")
+    args = parser.parse_args()
+
+    forward = None
+    if args.forward:
+        ip, port = args.forward.rsplit(":", 1)
+        forward = (ip, int(port))
+
+    echo_proc(args.port, forward)
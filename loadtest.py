@@ -0,0 +1,419 @@
+import argparse
+import heapq
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from facepipeline import PipelineConfig, SignalFrame
+from latencycontrol import percentile
+from latencyprobe import split_probe
+from stationmsg import SIGNAL_NAMES, split_boolean_msg, split_event_msg, split_relay_packet
+from udpsink import format_boolean_msg, format_event_msgs
+
+# Load test of the network path between stations and game server on loopback.
+# Simulated stations send exactly the messages UdpSink produces, the stub of
+# game server decodes them and measures throughput, loss, reordering and one
+# way latency:
+#
+#   python loadtest.py --stations 12 --rate 30 --duration 10
+#   python loadtest.py --stations 12 --events
+#   python loadtest.py --server-only --port 4243        (e.g. behind relay.py)
+#   python loadtest.py --stations-only --target 127.0.0.1:4242
+#
+# Signals of boolean messages are bits of the per station frame counter, so
+# the stub can find lost, reordered and repeated packets without changing the
+# format; their latency is known only when stations run in the same process.
+# Event messages carry time of sending already. Relay packets "{tick};..."
+# are recognized and their messages decoded one by one (see stationmsg.py).
+
+SEQUENCE_MOD = 2 ** len(SIGNAL_NAMES)
+REPORT_INTERVAL = 5  # [s]
+
+
+def sequence_frame(group_id: int, sequence: int, signal_codes: Dict[str, int]) -> SignalFrame:
+    """
+    Creates signal frame whose signals, in order of their codes, are bits of the sequence.
+    Args:
+        group_id (int): Group of simulated station.
+        sequence (int): Frame counter of the station.
+        signal_codes (Dict[str, int]): Signal name -> code from config.
+    Returns:
+        SignalFrame: Synthetic signal frame.
+    """
+    names = sorted(SIGNAL_NAMES, key=lambda name: signal_codes[name])
+    sequence %= SEQUENCE_MOD
+    values = {
+        name: bool(sequence >> (len(names) - 1 - i) & 1) for i, name in enumerate(names)
+    }
+    now = time.monotonic()
+    return SignalFrame(group_id, sequence, 0, now, now, now, [], **values)
+
+
+class StationSimulator:
+    """
+    Sends messages of N stations at given frame rate, every station from its own socket.
+    Send times of boolean messages are kept, so the stub running in the same
+    process can measure their one way latency.
+    """
+
+    def __init__(
+        self,
+        stations: int,
+        rate: float,
+        target: Tuple[str, int],
+        boolean_msg: bool = True,
+        first_group: int = 0,
+        signal_codes: Dict[str, int] = None,
+    ):
+        self.rate = rate
+        self.target = target
+        self.boolean_msg = boolean_msg
+        self.signal_codes = signal_codes or PipelineConfig().signal_codes
+        self.groups = list(range(first_group, first_group + stations))
+        self.sockets = {
+            group_id: socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            for group_id in self.groups
+        }
+
+        # (group id, sequence) -> time.monotonic() of sending
+        self.send_times: Dict[Tuple[int, int], float] = dict()
+        self.sent = {group_id: 0 for group_id in self.groups}
+        self.frames = {group_id: 0 for group_id in self.groups}
+        self.late = 0  # frames sent after their time because sender couldn't keep up
+
+    def run(self, duration: float, stop_event: threading.Event = None) -> None:
+        """
+        Sends messages of all stations for duration seconds.
+        """
+        period = 1 / self.rate
+        start = time.monotonic()
+        end = start + duration
+
+        # stations start evenly spread over one period like unsynchronized cameras
+        schedule = [
+            (start + period * i / len(self.groups), group_id)
+            for i, group_id in enumerate(self.groups)
+        ]
+        heapq.heapify(schedule)
+
+        while schedule:
+            next_time, group_id = heapq.heappop(schedule)
+            if next_time >= end or (stop_event is not None and stop_event.is_set()):
+                break
+
+            now = time.monotonic()
+            if next_time > now:
+                time.sleep(next_time - now)
+            elif now - next_time > period:
+                self.late += 1
+
+            self._send_frame(group_id)
+            heapq.heappush(schedule, (next_time + period, group_id))
+
+        for udp_socket in self.sockets.values():
+            udp_socket.close()
+
+    def _send_frame(self, group_id: int) -> None:
+        sequence = self.frames[group_id] % SEQUENCE_MOD
+        frame = sequence_frame(group_id, sequence, self.signal_codes)
+        self.frames[group_id] += 1
+
+        if self.boolean_msg:
+            msgs = [format_boolean_msg(frame, self.signal_codes)]
+            self.send_times[(group_id, sequence)] = time.monotonic()
+        else:
+            msgs = format_event_msgs(frame, self.signal_codes)
+
+        for msg in msgs:
+            self.sockets[group_id].sendto(msg.encode("ascii"), self.target)
+            self.sent[group_id] += 1
+
+
+class StreamStats:
+    """
+    Reception statistics of one stream (group or relay ticks).
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.bytes = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.latencies: List[float] = []
+        self.next_sequence = None
+        self.last_event_time = None
+        # reception of the first and last counted message, the stream's own window
+        self.first_time = None
+        self.last_time = None
+
+    def count(self, now: float, size: int) -> None:
+        """
+        Counts received message into throughput of the stream.
+        """
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+        self.received += 1
+        self.bytes += size
+
+    @property
+    def elapsed(self) -> float:
+        if self.first_time is None:
+            return 1e-9
+        return max(self.last_time - self.first_time, 1e-9)
+
+    def sequence(self, sequence: int, modulo: Optional[int]) -> bool:
+        """
+        Tracks loss and reordering using sequence number of the packet.
+        Returns True if the packet repeats the previous one.
+        """
+        if self.next_sequence is None:
+            self.next_sequence = sequence + 1
+            return False
+
+        if modulo is None:
+            gap = sequence - self.next_sequence
+            late = gap < 0
+        else:
+            gap = (sequence - self.next_sequence) % modulo
+            late = gap >= modulo // 2
+
+        if gap == -1 or (modulo is not None and gap == modulo - 1):
+            # the same packet again, e.g. relay repeating the latest state
+            self.duplicates += 1
+            return True
+
+        if late:
+            # packet counted as lost arrived after all
+            self.reordered += 1
+            self.lost = max(self.lost - 1, 0)
+            return False
+
+        self.lost += gap
+        self.next_sequence = sequence + 1
+        if modulo is not None:
+            self.next_sequence %= modulo
+        return False
+
+    def event_time(self, sent_time: float) -> None:
+        """
+        Tracks reordering of event messages using their time of sending.
+        """
+        if self.last_event_time is not None and sent_time < self.last_event_time:
+            self.reordered += 1
+        else:
+            self.last_event_time = sent_time
+
+
+class GameServerStub:
+    """
+    Receives and decodes messages like the game server and collects statistics
+    per group.
+    """
+
+    def __init__(self, port: int, simulator: StationSimulator = None):
+        self.port = port
+        self.simulator = simulator
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.udp_socket.bind(("127.0.0.1", port))
+        self.udp_socket.settimeout(0.1)
+
+        self.groups: Dict[int, StreamStats] = dict()
+        self.relay = StreamStats()
+        self.unknown = 0
+        self.start_time = None
+
+    def run(self, stop_event: threading.Event, report_interval: float = REPORT_INTERVAL) -> None:
+        """
+        Receives packets until stop_event is set.
+        """
+        next_report = time.monotonic() + report_interval
+        while not stop_event.is_set():
+            try:
+                data, _ = self.udp_socket.recvfrom(4096)
+            except socket.timeout:
+                data = None
+
+            now = time.monotonic()
+            if data is not None:
+                if self.start_time is None:
+                    self.start_time = now
+                self.receive(data.decode("ascii", errors="replace"), now, len(data))
+
+            if report_interval and now >= next_report:
+                next_report = now + report_interval
+                self.print_report()
+
+        self.udp_socket.close()
+
+    def receive(self, packet: str, now: float, size: int) -> None:
+        """
+        Decodes station packet or relay packet with several station messages.
+        """
+        relay = split_relay_packet(packet)
+        if relay is not None:
+            tick, msgs = relay
+            self.relay.count(now, size)
+            if tick is not None:
+                self.relay.sequence(tick, None)
+            for msg in msgs:
+                self.receive_msg(msg, now, 0)
+        else:
+            self.receive_msg(packet, now, size)
+
+    def receive_msg(self, msg: str, now: float, size: int) -> None:
+        msg, _, _ = split_probe(msg)
+        event = split_event_msg(msg)
+        boolean = split_boolean_msg(msg)
+        if event is not None:
+            group_id, sent_time, _ = event
+            stats = self._group(group_id)
+            stats.event_time(sent_time)
+            stats.latencies.append((time.time() - sent_time) * 1000)
+
+        elif boolean is not None:
+            group_id, bits = boolean
+            sequence = int(bits, 2)
+            stats = self._group(group_id)
+            # repeated state (relay sends the latest one every tick) is not a new
+            # message, its latency would be measured from the original sending
+            if stats.sequence(sequence, SEQUENCE_MOD):
+                return
+            if self.simulator is not None:
+                sent_time = self.simulator.send_times.get((group_id, sequence))
+                if sent_time is not None:
+                    stats.latencies.append((now - sent_time) * 1000)
+
+        else:
+            self.unknown += 1
+            return
+
+        stats.count(now, size)
+
+    def _group(self, group_id: int) -> StreamStats:
+        if group_id not in self.groups:
+            self.groups[group_id] = StreamStats()
+        return self.groups[group_id]
+
+    def print_report(self) -> None:
+        """
+        Prints throughput, loss, reordering and latency of every group and in total.
+        Throughput of every stream is measured over its own first to last message,
+        so relay ticks arriving after the stations stopped don't lower it.
+        """
+        if self.start_time is None:
+            print("No packets received")
+            return
+
+        total = StreamStats()
+        for group_id in sorted(self.groups):
+            stats = self.groups[group_id]
+            self._print_stream(f"Group {group_id}", stats, group_id)
+            if stats.first_time is not None:
+                if total.first_time is None or stats.first_time < total.first_time:
+                    total.first_time = stats.first_time
+                if total.last_time is None or stats.last_time > total.last_time:
+                    total.last_time = stats.last_time
+            total.received += stats.received
+            total.bytes += stats.bytes
+            total.lost += stats.lost
+            total.reordered += stats.reordered
+            total.duplicates += stats.duplicates
+            total.latencies += stats.latencies
+        self._print_stream("Total", total, None)
+
+        if self.relay.received:
+            self._print_stream("Relay ticks", self.relay, None)
+        if self.unknown:
+            print(f"Unrecognized messages: {self.unknown}")
+
+    def _print_stream(self, name: str, stats: StreamStats, group_id) -> None:
+        elapsed = stats.elapsed
+        lost = stats.lost
+        # event messages have no sequence, simulated station knows how many were sent
+        if self.simulator is not None and not self.simulator.boolean_msg:
+            if group_id is None:
+                sent = sum(self.simulator.sent.values())
+            else:
+                sent = self.simulator.sent.get(group_id, 0)
+            lost = max(sent - stats.received, 0)
+
+        expected = stats.received + lost
+        latency = ""
+        if stats.latencies:
+            latency = (
+                f", latency p50 {percentile(stats.latencies, 50):.2f} ms"
+                f" p95 {percentile(stats.latencies, 95):.2f} ms"
+                f" p99 {percentile(stats.latencies, 99):.2f} ms"
+                f" max {max(stats.latencies):.2f} ms"
+            )
+        print(
+            f"{name}: {stats.received / elapsed:.1f} msg/s, {stats.bytes / elapsed / 1024:.1f} kB/s, "
+            f"lost {lost} ({lost / expected if expected else 0:.2%}), "
+            f"reordered {stats.reordered}, repeated {stats.duplicates}{latency}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="UDP load generator of stations and game server stub"
+    )
+    parser.add_argument("--stations", type=int, default=12, help="number of simulated stations")
+    parser.add_argument("--rate", type=float, default=30, help="frames per second of every station")
+    parser.add_argument("--duration", type=float, default=10, help="length of the test [s]")
+    parser.add_argument("--events", action="store_true", help="send BOOLEAN_MSG 0 messages")
+    parser.add_argument("--first-group", type=int, default=0, help="group id of first station")
+    parser.add_argument("--port", type=int, default=4242, help="port of the game server stub")
+    parser.add_argument("--target", help="ip:port stations send to, stub port by default")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--server-only", action="store_true", help="run only game server stub")
+    group.add_argument("--stations-only", action="store_true", help="run only stations")
+    args = parser.parse_args()
+
+    target = ("127.0.0.1", args.port)
+    if args.target:
+        ip, port = args.target.rsplit(":", 1)
+        target = (ip, int(port))
+
+    simulator = None
+    if not args.server_only:
+        simulator = StationSimulator(
+            args.stations, args.rate, target, not args.events, args.first_group
+        )
+
+    stop_event = threading.Event()
+    stub = None
+    stub_thread = None
+    if not args.stations_only:
+        stub = GameServerStub(args.port, simulator)
+        stub_thread = threading.Thread(target=stub.run, args=(stop_event,), daemon=True)
+        stub_thread.start()
+
+    try:
+        if simulator is not None:
+            print(
+                f"Sending {args.stations} stations at {args.rate} fps to "
+                f"{target[0]}:{target[1]} for {args.duration} s"
+            )
+            simulator.run(args.duration, stop_event)
+            # waiting for packets still on the way
+            time.sleep(0.5)
+        else:
+            stop_event.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        if stub_thread is not None:
+            stub_thread.join()
+
+    if simulator is not None:
+        print(
+            f"Sent {sum(simulator.sent.values())} messages, "
+            f"frames sent late: {simulator.late}"
+        )
+    if stub is not None:
+        stub.print_report()
@@ -0,0 +1,222 @@
+import json
+import os
+import socket
+import time
+from typing import Dict, List
+
+from latencyprobe import split_probe
+from stationmsg import parse_msg, relay_packet
+
+# Relay between stations and game server. Stations send their packets to the
+# relay (SERVER_IP:SERVER_PORT in their config) and the relay sends one packet
+# with states of all groups to GAME_IP:GAME_PORT every tick:
+#
+#   "{tick};{group message};{group message};..."
+#
+# (formats of the messages are defined in stationmsg.py)
+# where group message is unchanged message of the station - the latest one for
+# BOOLEAN_MSG mode and every message received since last tick otherwise.
+# Groups which didn't send anything for RELAY_STALE_MS are left out.
+# Probe tags of messages (see latencyprobe.py) are kept.
+#
+# Stations send only when they have a new frame (or an event), so receive rate
+# of a group is reported next to the tick rate instead of ticks without packet.
+# Loss is counted only from gaps in packet sequence of probe tags.
+
+if not os.path.isfile("face_config.json"):
+    print("Missing config file, download face_config.json before running")
+    quit()
+
+with open("face_config.json", "r") as file:
+    face_config = json.load(file)
+
+# relay keys are optional, so stations' configs without them work as well
+RELAY_PORT = face_config["SERVER_PORT"]
+GAME_IP = face_config.get("GAME_IP", face_config["SERVER_IP"])
+GAME_PORT = face_config.get("GAME_PORT", RELAY_PORT + 1)
+TICK_RATE = face_config.get("RELAY_TICK_RATE", 30)  # [Hz]
+STALE_TIME = face_config.get("RELAY_STALE_MS", 500) / 1000  # [s]
+REPORT_INTERVAL = face_config.get("METRICS_INTERVAL", 10)  # [s]
+
+class GroupState:
+    """
+    Latest state of one group together with its reception statistics.
+    """
+
+    def __init__(self, group_id: int):
+        self.group_id = group_id
+        self.latest = None  # latest boolean message
+        self.events: List[str] = []  # event messages received since last tick
+        self.last_time = None
+        self.packets = 0
+
+        # packets and time of the last report for receive rate
+        self.report_packets = 0
+        self.report_time = None
+
+        # loss from probe tags, counted only for tagged packets
+        self.next_sequence = None
+        self.probed = 0
+        self.lost = 0
+
+    def receive(self, msg: str, is_boolean: bool, now: float) -> None:
+        """
+        Stores received message of the group.
+        Args:
+            msg (str): Message as sent by the station.
+            is_boolean (bool): True for BOOLEAN_MSG format.
+            now (float): time.monotonic() value of reception.
+        Returns:
+            None
+        """
+        if is_boolean:
+            self.latest = msg
+        else:
+            self.events.append(msg)
+        if self.report_time is None:
+            self.report_time = now
+        self.last_time = now
+        self.packets += 1
+
+        _, sequence, _ = split_probe(msg)
+        if sequence is not None:
+            self.sequence(sequence)
+
+    def sequence(self, sequence: int) -> None:
+        """
+        Counts packets lost before the probe packet with given sequence number.
+        """
+        self.probed += 1
+        if self.next_sequence is None or sequence == 0:
+            # first packet or restarted station
+            pass
+        elif sequence > self.next_sequence:
+            self.lost += sequence - self.next_sequence
+        elif sequence < self.next_sequence:
+            # late packet already counted as lost
+            self.lost = max(0, self.lost - 1)
+            return
+        self.next_sequence = sequence + 1
+
+    def is_stale(self, now: float) -> bool:
+        return self.last_time is None or now - self.last_time > STALE_TIME
+
+    def collect(self, now: float) -> List[str]:
+        """
+        Returns messages of the group for the current tick.
+        Args:
+            now (float): time.monotonic() value of the tick.
+        Returns:
+            List[str]: Messages to put into combined packet.
+        """
+        msgs = self.events
+        self.events = []
+        if self.latest is not None and not self.is_stale(now):
+            msgs = [self.latest] + msgs
+        return msgs
+
+
+def print_report(groups: Dict[int, GroupState], now: float) -> None:
+    """
+    Prints staleness, receive rate and loss of every group.
+    Args:
+        groups (Dict[int, GroupState]): States of known groups.
+        now (float): Current time.monotonic() value.
+    Returns:
+        None
+    """
+    for group_id in sorted(groups):
+        group = groups[group_id]
+        age_ms = (now - group.last_time) * 1000
+        elapsed = now - group.report_time
+        rate = (group.packets - group.report_packets) / elapsed if elapsed > 0 else 0.0
+        group.report_packets = group.packets
+        group.report_time = now
+
+        # without probe tags there is no way to tell lost packets from packets not sent
+        if group.probed:
+            loss = group.lost / (group.probed + group.lost)
+            loss_msg = f"lost {group.lost}/{group.probed + group.lost} ({loss:.1%})"
+        else:
+            loss_msg = "loss unknown (no probe tags)"
+        print(
+            f"Group {group_id}: packets {group.packets}, last {age_ms:.0f} ms ago"
+            f"{' (stale)' if group.is_stale(now) else ''}, "
+            f"receive rate {rate:.1f} Hz (tick rate {TICK_RATE} Hz), {loss_msg}"
+        )
+
+
+def relay_proc() -> None:
+    """
+    Main relay function receiving packets of all stations and sending
+    one combined packet to game server at TICK_RATE.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    in_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    in_socket.bind(("0.0.0.0", RELAY_PORT))
+    out_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    print(f"Relaying port {RELAY_PORT} to {GAME_IP}:{GAME_PORT} at {TICK_RATE} Hz")
+
+    groups: Dict[int, GroupState] = dict()
+    tick_period = 1 / TICK_RATE
+    tick = 0
+    next_tick = time.monotonic() + tick_period
+    next_report = time.monotonic() + REPORT_INTERVAL
+    unknown = 0
+
+    try:
+        while True:
+            # receiving packets until the next tick
+            remaining = next_tick - time.monotonic()
+            if remaining > 0:
+                in_socket.settimeout(remaining)
+                try:
+                    data, _ = in_socket.recvfrom(1024)
+                except socket.timeout:
+                    continue
+
+                msg = data.decode("ascii", errors="replace")
+                parsed = parse_msg(msg)
+                if parsed is None:
+                    unknown += 1
+                    continue
+
+                group_id, is_boolean = parsed
+                if group_id not in groups:
+                    groups[group_id] = GroupState(group_id)
+                groups[group_id].receive(msg, is_boolean, time.monotonic())
+                continue
+
+            # sending combined packet with all groups
+            now = time.monotonic()
+            msgs = []
+            for group_id in sorted(groups):
+                msgs += groups[group_id].collect(now)
+            out_socket.sendto(relay_packet(tick, msgs).encode("ascii"), (GAME_IP, GAME_PORT))
+            tick += 1
+
+            # keeping the tick grid, but not catching up after long stall
+            next_tick += tick_period
+            if next_tick < now:
+                next_tick = now + tick_period
+
+            if REPORT_INTERVAL and now >= next_report:
+                next_report = now + REPORT_INTERVAL
+                print_report(groups, now)
+                if unknown:
+                    print(f"Unrecognized packets: {unknown}")
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        in_socket.close()
+        out_socket.close()
+
+
+if __name__ == "__main__":
+    relay_proc()
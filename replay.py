@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+
+import cv2
+
+from facepipeline import SIGNAL_NAMES, FacePipeline, PipelineConfig, SignalFrame
+from latencycontrol import percentile
+
+# Replays recorded clip through FacePipeline as if it came from camera and
+# prints the pipeline metrics, including accuracy of head motion prediction
+# compared with lagging signals:
+#
+#   python replay.py clip.mp4 --horizon 80
+#
+# Signals with ROI tracking can be compared with the full frame run the same way:
+#
+#   python replay.py clip.mp4 --no-prediction --roi 0
+#   python replay.py clip.mp4 --no-prediction --roi 1
+
+
+class ClipSource:
+    """
+    Frame source reading a recorded clip. Frames are paced to the frame rate
+    of the clip, so the model in LIVE_STREAM mode sees them like a live camera.
+    """
+
+    def __init__(self, path: str, realtime: bool = True):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError(f"Couldn't open clip {path}")
+
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 30
+        self.period = 1 / fps
+        self.realtime = realtime
+        self._next_time = None
+
+    def read(self):
+        """
+        Returns (ret, frame) like cv2.VideoCapture.read().
+        """
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_time is None:
+                self._next_time = now
+            if self._next_time > now:
+                time.sleep(self._next_time - now)
+            self._next_time += self.period
+        return self.capture.read()
+
+    def release(self) -> None:
+        self.capture.release()
+
+
+def load_config() -> PipelineConfig:
+    """
+    Returns config from face_config.json if it exists, default one otherwise.
+    """
+    if os.path.isfile("face_config.json"):
+        with open("face_config.json", "r") as file:
+            return PipelineConfig.from_dict(json.load(file))
+    return PipelineConfig()
+
+
+def replay_proc(path: str, config: PipelineConfig, realtime: bool = True) -> None:
+    """
+    Runs the clip through the pipeline and prints summary of the signals.
+
+    Args:
+        path (str): Path of the recorded clip.
+        config (PipelineConfig): Pipeline settings.
+        realtime (bool): Pace the frames to the frame rate of the clip.
+
+    Returns:
+        None
+    """
+    source = ClipSource(path, realtime)
+    pipeline = FacePipeline(config, source)
+
+    latencies = []
+    counts = Counter()
+
+    def collect(frame: SignalFrame) -> None:
+        latencies.append(frame.latency * 1000)
+        counts.update(name for name, value in frame.signals().items() if value)
+
+    pipeline.subscribe(collect)
+    try:
+        pipeline.run()
+    finally:
+        source.release()
+
+    print(
+        f"Signal frames: {len(latencies)}, capture to signal latency "
+        f"p50: {percentile(latencies, 50):.1f} ms, p95: {percentile(latencies, 95):.1f} ms"
+    )
+    print("Signals: " + ", ".join(f"{name}: {counts[name]}" for name in SIGNAL_NAMES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded clip through FacePipeline")
+    parser.add_argument("clip", help="path of the recorded clip")
+    parser.add_argument(
+        "--no-prediction", action="store_true", help="disable head motion prediction"
+    )
+    parser.add_argument("--horizon", type=float, help="prediction horizon [ms]")
+    parser.add_argument("--gate", type=float, help="prediction gate [std]")
+    parser.add_argument(
+        "--fast", action="store_true", help="don't pace frames to the clip frame rate"
+    )
+    parser.add_argument(
+        "--roi", type=int, choices=[0, 1], help="ROI tracking on/off (default from config)"
+    )
+    args = parser.parse_args()
+
+    config = load_config()
+    config.show_camera = False
+    config.metrics_interval = 0
+    config.prediction = not args.no_prediction
+    if args.horizon is not None:
+        config.prediction_horizon_ms = args.horizon
+    if args.gate is not None:
+        config.prediction_gate = args.gate
+    if args.roi is not None:
+        config.roi_tracking = bool(args.roi)
+
+    replay_proc(args.clip, config, realtime=not args.fast)
@@ -0,0 +1,183 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass
+class FrameResult:
+    """
+    Landmarker result together with the bookkeeping of the frame it belongs to.
+
+    Attributes:
+        sequence (int): Number of the frame given when it was captured.
+        timestamp_ms (int): Timestamp passed to detect_async for this frame.
+        capture_time (float): time.monotonic() value when the frame was read from camera.
+        completion_time (float): time.monotonic() value when the model returned the result.
+        result (FaceLandmarkerResult): Result returned by the model for this frame.
+        roi (Roi): Region of the frame passed to the model, None for the full frame.
+    """
+
+    sequence: int
+    timestamp_ms: int
+    capture_time: float
+    completion_time: float
+    result: Any
+    roi: Any = None
+
+    @property
+    def latency(self) -> float:
+        """
+        Returns the capture to completion time of the frame in seconds.
+        """
+        return self.completion_time - self.capture_time
+
+
+class ResultSlot:
+    """
+    Double buffered handoff of landmarker results between MediaPipe's callback
+    thread and the thread that processes them.
+
+    The callback only writes to the back buffer, the worker swaps it to the
+    front buffer when taking it. A result that is overwritten before it was
+    taken, or that arrives after a result of a newer frame, is counted as
+    superseded, a frame that never got a result from the model is counted as
+    dropped. All state is guarded by a single lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        # frames passed to the model which didn't get a result yet,
+        # timestamp_ms -> (sequence, capture_time, roi)
+        self._pending: Dict[int, Tuple[int, float, Any]] = dict()
+        self._back: Optional[FrameResult] = None
+        self._front: Optional[FrameResult] = None
+        self._next_sequence = 0
+        self._last_timestamp_ms = None  # newest published frame
+
+        # counters
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.superseded = 0
+        self.consumed = 0
+
+    def register_frame(
+        self, timestamp_ms: int, capture_time: float = None, roi: Any = None
+    ) -> int:
+        """
+        Registers frame which is about to be passed to detect_async.
+
+        Args:
+            timestamp_ms (int): Timestamp which will be passed to detect_async.
+            capture_time (float): time.monotonic() value when the frame was read,
+                current time is used if not given.
+            roi (Roi): Region of the frame passed to the model, None for the full frame.
+
+        Returns:
+            int: Sequence number given to the frame.
+        """
+        if capture_time is None:
+            capture_time = time.monotonic()
+
+        with self._lock:
+            sequence = self._next_sequence
+            self._next_sequence += 1
+            self._pending[timestamp_ms] = (sequence, capture_time, roi)
+            self.submitted += 1
+        return sequence
+
+    def publish(
+        self, result: Any, timestamp_ms: int, synchronous: bool = False
+    ) -> Optional[FrameResult]:
+        """
+        Stores the result for the frame with given timestamp. Meant to be called
+        from the landmarker callback, so it does nothing more than bookkeeping.
+
+        Args:
+            result (FaceLandmarkerResult): Result returned by the model.
+            timestamp_ms (int): Timestamp received in the callback.
+            synchronous (bool): Result of detection run in the calling thread
+                (VIDEO or IMAGE mode); older frames passed to detect_async may
+                still get their results, so they are not counted as dropped.
+
+        Returns:
+            FrameResult: Stored entry or None if the frame was never registered
+                or a newer frame was already published.
+        """
+        completion_time = time.monotonic()
+
+        with self._lock:
+            frame = self._pending.pop(timestamp_ms, None)
+
+            # asynchronous results come in order - frames older than this one
+            # won't get any result, the model skipped them
+            if not synchronous:
+                skipped = [ts for ts in self._pending if ts < timestamp_ms]
+                for ts in skipped:
+                    del self._pending[ts]
+                self.dropped += len(skipped)
+
+            if frame is None:
+                return None
+
+            # result of a frame older than the published one, e.g. detect_async
+            # result arriving after a synchronous one
+            if self._last_timestamp_ms is not None and timestamp_ms < self._last_timestamp_ms:
+                self.superseded += 1
+                return None
+            self._last_timestamp_ms = timestamp_ms
+
+            sequence, capture_time, roi = frame
+            if self._back is not None:
+                self.superseded += 1
+
+            self._back = FrameResult(
+                sequence, timestamp_ms, capture_time, completion_time, result, roi
+            )
+            self.completed += 1
+            self._ready.notify()
+            return self._back
+
+    def take(self, timeout: float = None) -> Optional[FrameResult]:
+        """
+        Takes the newest result which was not taken yet, waiting for it if necessary.
+
+        Args:
+            timeout (float): Maximal waiting time in seconds, None waits forever.
+
+        Returns:
+            FrameResult: Newest result or None if nothing arrived before timeout.
+        """
+        with self._ready:
+            if self._back is None:
+                self._ready.wait(timeout)
+            if self._back is None:
+                return None
+
+            self._front, self._back = self._back, None
+            self.consumed += 1
+            return self._front
+
+    def latest(self) -> Optional[FrameResult]:
+        """
+        Returns the last taken result without consuming anything,
+        e.g. for visualization from another thread.
+        """
+        with self._lock:
+            return self._front
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns snapshot of the slot counters.
+        """
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "superseded": self.superseded,
+                "consumed": self.consumed,
+                "pending": len(self._pending),
+            }
@@ -0,0 +1,193 @@
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from mediapipe.tasks.python.components.containers.landmark import NormalizedLandmark
+
+ROI_MARGIN = 0.3  # margin added on each side of the face box, relative to its size
+MIN_FILL = 0.35  # crop is recomputed when face gets smaller than this part of it
+EDGE_MARGIN = 0.05  # crop is recomputed when face gets this close to its edge
+
+
+@dataclass
+class Roi:
+    """
+    Region of the camera frame passed to the model, in pixels of the full frame.
+
+    Attributes:
+        x (int): Left edge of the region.
+        y (int): Top edge of the region.
+        width (int): Width of the region.
+        height (int): Height of the region.
+        frame_width (int): Width of the full frame.
+        frame_height (int): Height of the full frame.
+    """
+
+    x: int
+    y: int
+    width: int
+    height: int
+    frame_width: int
+    frame_height: int
+
+    def crop(self, frame):
+        """
+        Returns view of the frame (numpy.ndarray) limited to the region.
+        """
+        return frame[self.y : self.y + self.height, self.x : self.x + self.width]
+
+    def to_frame(self, landmarks: List[NormalizedLandmark]) -> List[NormalizedLandmark]:
+        """
+        Maps landmarks normalized to the region into landmarks normalized to the full frame.
+        Args:
+            landmarks (List[NormalizedLandmark]): Landmarks returned for the cropped frame.
+        Returns:
+            List[NormalizedLandmark]: Landmarks in full frame coordinates.
+        """
+        sx = self.width / self.frame_width
+        sy = self.height / self.frame_height
+        ox = self.x / self.frame_width
+        oy = self.y / self.frame_height
+
+        # z uses roughly the same scale as x, so it is scaled with the width
+        return [
+            NormalizedLandmark(
+                x=landmark.x * sx + ox,
+                y=landmark.y * sy + oy,
+                z=landmark.z * sx,
+                visibility=landmark.visibility,
+                presence=landmark.presence,
+            )
+            for landmark in landmarks
+        ]
+
+    @property
+    def area(self) -> int:
+        return self.width * self.height
+
+
+class RoiTracker:
+    """
+    Tracks the face region between frames, so only the part of the frame around
+    the face from previous result is converted and passed to the model.
+
+    The region is kept as long as the face stays well inside it; when tracking
+    is lost the full frame is used. Framing of the model input changes with the
+    region, so cropped frames have to be detected without MediaPipe's tracking
+    between frames (IMAGE mode).
+    The worker updates the tracker while the main loop reads it, so the state
+    is guarded by a lock.
+    """
+
+    def __init__(self, margin: float = ROI_MARGIN):
+        self.margin = margin
+        # region in full frame normalized coordinates (x0, y0, x1, y1)
+        self._box = None
+        self._frame_size = None
+        self._lock = threading.Lock()
+
+        # counters
+        self.frames = 0
+        self.lost = 0
+        self.full_pixels = 0
+        self.processed_pixels = 0
+
+    def region(self, frame_width: int, frame_height: int) -> Optional[Roi]:
+        """
+        Returns region of the next frame to process.
+        Args:
+            frame_width (int): Width of the camera frame.
+            frame_height (int): Height of the camera frame.
+        Returns:
+            Roi: Region around the tracked face or None if full frame should be used.
+        """
+        with self._lock:
+            self._frame_size = (frame_width, frame_height)
+            self.frames += 1
+            self.full_pixels += frame_width * frame_height
+
+            if self._box is None:
+                self.processed_pixels += frame_width * frame_height
+                return None
+
+            x0, y0, x1, y1 = self._box
+            left = max(0, int(x0 * frame_width))
+            top = max(0, int(y0 * frame_height))
+            right = min(frame_width, int(x1 * frame_width + 0.5))
+            bottom = min(frame_height, int(y1 * frame_height + 0.5))
+
+            if right - left < 2 or bottom - top < 2:
+                self._box = None
+                self.processed_pixels += frame_width * frame_height
+                return None
+
+            roi = Roi(left, top, right - left, bottom - top, frame_width, frame_height)
+            self.processed_pixels += roi.area
+            return roi
+
+    def update(self, landmarks: List[NormalizedLandmark]) -> None:
+        """
+        Updates tracked region using landmarks of the last result.
+        Args:
+            landmarks (List[NormalizedLandmark]): Face landmarks in full frame coordinates,
+                None or empty list when no face was detected.
+        Returns:
+            None
+        """
+        with self._lock:
+            if not landmarks or self._frame_size is None:
+                # tracking lost - going back to full frame
+                if self._box is not None:
+                    self.lost += 1
+                self._box = None
+                return
+
+            xs = [landmark.x for landmark in landmarks]
+            ys = [landmark.y for landmark in landmarks]
+            fx0, fx1, fy0, fy1 = min(xs), max(xs), min(ys), max(ys)
+
+            if self._box is not None:
+                x0, y0, x1, y1 = self._box
+                edge_x = (x1 - x0) * EDGE_MARGIN
+                edge_y = (y1 - y0) * EDGE_MARGIN
+                inside = (
+                    fx0 > x0 + edge_x
+                    and fx1 < x1 - edge_x
+                    and fy0 > y0 + edge_y
+                    and fy1 < y1 - edge_y
+                )
+                filled = (fx1 - fx0) > MIN_FILL * (x1 - x0)
+                if inside and filled:
+                    return
+
+            # square region in pixels around the face box with margin on each side
+            frame_width, frame_height = self._frame_size
+            cx = (fx0 + fx1) / 2 * frame_width
+            cy = (fy0 + fy1) / 2 * frame_height
+            side = max((fx1 - fx0) * frame_width, (fy1 - fy0) * frame_height)
+            side *= 1 + 2 * self.margin
+            half_w = min(side, frame_width) / 2
+            half_h = min(side, frame_height) / 2
+
+            # shifting region inside the frame instead of shrinking it
+            cx = min(max(cx, half_w), frame_width - half_w)
+            cy = min(max(cy, half_h), frame_height - half_h)
+
+            self._box = (
+                (cx - half_w) / frame_width,
+                (cy - half_h) / frame_height,
+                (cx + half_w) / frame_width,
+                (cy + half_h) / frame_height,
+            )
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns snapshot of the tracker counters.
+        """
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "lost": self.lost,
+                "pixel_ratio": (
+                    self.processed_pixels / self.full_pixels if self.full_pixels else 1.0
+                ),
+            }
@@ -0,0 +1,116 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from latencyprobe import split_probe
+
+# Format of the messages stations send to game server (or relay.py) and of
+# the combined relay packets. Building and parsing live together here, so
+# face pipeline, relay and load test can't get out of sync. The module doesn't
+# need mediapipe, so the tools run on machines without it.
+#
+#   boolean message:  "{group id}{0/1 of every signal in order of their codes}"
+#   event message:    "({group id})({time.time() of sending}){codes}"
+#   relay packet:     "{tick};{station message};{station message};..."
+#
+# Any message may end with probe tag "#{sequence}:{capture_us}" (see latencyprobe.py).
+
+# Signals produced for every frame with a face, names match face_config.json keys
+SIGNAL_NAMES = [
+    "EYE_CHARGING",
+    "EYE_FAILED",
+    "EYE_ACTIVATION",
+    "MOUTH_OPENED",
+    "SMILE",
+    "IS_RIGHT",
+    "IS_LEFT",
+    "IS_UP",
+    "IS_DOWN",
+]
+SIGNAL_COUNT = len(SIGNAL_NAMES)
+
+EVENT_MSG = re.compile(r"^\((\d+)\)\(([^)]*)\)(\d*)$")
+RELAY_SEPARATOR = ";"
+
+
+def boolean_msg(group_id: int, values: Iterable[bool]) -> str:
+    """
+    Creates boolean message from values of all signals in order of their codes.
+    """
+    return f"{group_id}" + "".join(str(int(value)) for value in values)
+
+
+def event_msg(group_id: int, send_time: float, codes: str = "") -> str:
+    """
+    Creates event message with codes of the signals.
+    """
+    return f"({group_id})({send_time}){codes}"
+
+
+def split_boolean_msg(msg: str) -> Optional[Tuple[int, str]]:
+    """
+    Splits boolean message without probe tag.
+    Returns:
+        Tuple[int, str]: Group id and 0/1 digits of the signals, None for other messages.
+    """
+    if msg.isdigit() and len(msg) > SIGNAL_COUNT:
+        return int(msg[:-SIGNAL_COUNT]), msg[-SIGNAL_COUNT:]
+    return None
+
+
+def split_event_msg(msg: str) -> Optional[Tuple[int, float, str]]:
+    """
+    Splits event message without probe tag.
+    Returns:
+        Tuple[int, float, str]: Group id, time of sending and signal codes,
+            None for other messages.
+    """
+    match = EVENT_MSG.match(msg)
+    if not match:
+        return None
+    try:
+        send_time = float(match.group(2))
+    except ValueError:
+        return None
+    return int(match.group(1)), send_time, match.group(3)
+
+
+def parse_msg(msg: str) -> Optional[Tuple[int, bool]]:
+    """
+    Recognizes the group and format of station message.
+    Args:
+        msg (str): Message received from station, probe tag is allowed.
+    Returns:
+        Tuple[int, bool]: Group id and True for BOOLEAN_MSG format,
+            None if the message is not recognized.
+    """
+    msg, _, _ = split_probe(msg)
+    event = split_event_msg(msg)
+    if event is not None:
+        return event[0], False
+
+    boolean = split_boolean_msg(msg)
+    if boolean is not None:
+        return boolean[0], True
+
+    return None
+
+
+def relay_packet(tick: int, msgs: List[str]) -> str:
+    """
+    Creates relay packet with station messages of one tick.
+    """
+    return RELAY_SEPARATOR.join([str(tick)] + msgs)
+
+
+def split_relay_packet(packet: str) -> Optional[Tuple[Optional[int], List[str]]]:
+    """
+    Splits relay packet into tick and station messages.
+    Returns:
+        Tuple[int, List[str]]: Tick (None if it isn't a number) and messages,
+            None if the packet is a station message.
+    """
+    # station messages are always longer than the signals, relay tick alone isn't
+    if RELAY_SEPARATOR not in packet and not (packet.isdigit() and len(packet) <= SIGNAL_COUNT):
+        return None
+    tick, *msgs = packet.split(RELAY_SEPARATOR)
+    return (int(tick) if tick.isdigit() else None), msgs
@@ -0,0 +1,104 @@
+import socket
+import time
+from typing import Dict, List
+
+import supportfunctions as sf
+from facepipeline import PipelineConfig, SignalFrame
+from latencyprobe import LatencyProbe
+from stationmsg import boolean_msg, event_msg
+
+
+def format_boolean_msg(frame: SignalFrame, signal_codes: Dict[str, int]) -> str:
+    """
+    Creates BOOLEAN_MSG message: group id followed by 0/1 of every signal
+    in order of their codes.
+    Args:
+        frame (SignalFrame): Detected signals.
+        signal_codes (Dict[str, int]): Signal name -> code from config.
+    Returns:
+        str: Message for game.
+    """
+    # sorting in case of reverse order in config file
+    signals = sorted(frame.signals().items(), key=lambda item: signal_codes[item[0]])
+
+    return boolean_msg(frame.group_id, (value for _, value in signals))
+
+
+def format_event_msgs(frame: SignalFrame, signal_codes: Dict[str, int]) -> List[str]:
+    """
+    Creates messages "(group id)(time)codes" for signals which are set,
+    as sent when BOOLEAN_MSG is disabled.
+    Args:
+        frame (SignalFrame): Detected signals.
+        signal_codes (Dict[str, int]): Signal name -> code from config.
+    Returns:
+        List[str]: Messages for game, in order of sending.
+    """
+    msgs = []
+
+    # eyes - only one of the eye signals is sent
+    for name in ("EYE_CHARGING", "EYE_FAILED", "EYE_ACTIVATION"):
+        if getattr(frame, name):
+            msgs.append(event_msg(frame.group_id, time.time(), f"{signal_codes[name]}"))
+            break
+
+    # mouth - separate message for every signal
+    for name in ("MOUTH_OPENED", "SMILE"):
+        if getattr(frame, name):
+            msgs.append(event_msg(frame.group_id, time.time(), f"{signal_codes[name]}"))
+
+    # face movement - every message contains all directions found so far
+    send_time = time.time()
+    codes = ""
+    for name in ("IS_LEFT", "IS_RIGHT", "IS_UP", "IS_DOWN"):
+        if getattr(frame, name):
+            codes += f"{signal_codes[name]}"
+            msgs.append(event_msg(frame.group_id, send_time, codes))
+
+    return msgs
+
+
+class UdpSink:
+    """
+    FacePipeline subscriber sending signals to game server via UDP
+    in the format selected by BOOLEAN_MSG. In probe mode messages are tagged
+    with packet sequence and capture time and their echoes are measured.
+    """
+
+    def __init__(self, config: PipelineConfig):
+        self.server_ip = config.server_ip
+        self.server_port = config.server_port
+        self.boolean_msg = config.boolean_msg
+        self.signal_codes = config.signal_codes
+        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        self.probe = None
+        if config.probe:
+            self.probe = LatencyProbe(self.udp_socket, config.metrics_interval)
+            self.probe.start()
+
+    def __call__(self, frame: SignalFrame) -> None:
+        """
+        Sends messages for the signal frame.
+        Args:
+            frame (SignalFrame): Detected signals.
+        Returns:
+            None
+        """
+        if self.boolean_msg:
+            msgs = [format_boolean_msg(frame, self.signal_codes)]
+            print("Package:", msgs[0])
+        else:
+            msgs = format_event_msgs(frame, self.signal_codes)
+
+        # sending values to game server to handle corresponding signal
+        for msg in msgs:
+            if self.probe is not None:
+                msg = self.probe.tag(msg, frame.capture_time)
+            sf.send_msg_via_udp(msg, self.udp_socket, self.server_ip, self.server_port)
+
+    def close(self) -> None:
+        if self.probe is not None:
+            self.probe.stop()
+            self.probe.print_report()
+        self.udp_socket.close()